@@ -10,6 +10,7 @@ Multi-turn agent that:
 
 Usage:
     python json_sql_agent.py --form input/form.json --q "your question"
+    python json_sql_agent.py --form input/form.json --queries-file queries.jsonl --concurrency 4
 """
 
 from __future__ import annotations
@@ -17,12 +18,16 @@ import os
 import sys
 import json
 import argparse
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import sqlite3
 import time
-from typing import TypedDict, Annotated, Optional, Any, Dict, List
+from typing import TypedDict, Annotated, Optional, Any, Callable, Dict, List
 from operator import add
 
 import duckdb
-import pandas as pd
 from dotenv import load_dotenv
 
 # LangGraph imports
@@ -45,6 +50,56 @@ from json_sql_copilot import (
 load_dotenv()
 
 
+# ========================================
+# LLM response cache
+# ========================================
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+_llm_cache: Optional[sqlite3.Connection] = None
+
+
+def _get_llm_cache() -> sqlite3.Connection:
+    """Open (once) the SQLite file backing the LLM response cache"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+        _llm_cache.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, content TEXT, created REAL)"
+        )
+    return _llm_cache
+
+
+async def cached_ainvoke(llm: ChatOpenAI, messages: List[Any], ttl: int = LLM_CACHE_TTL) -> str:
+    """Return the LLM response content, reusing a stored answer for identical prompts.
+
+    Keyed by a hash of (model, temperature, message contents), so retries and
+    evaluation sweeps over the same request/schema/feedback skip the round-trip.
+    """
+    key_parts = [llm.model_name, str(llm.temperature)] + [m.content for m in messages]
+    key = hashlib.blake2b("\x1f".join(key_parts).encode("utf-8"), digest_size=32).hexdigest()
+    
+    cache = _get_llm_cache()
+    row = cache.execute("SELECT content, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+    if row and time.time() - row[1] < ttl:
+        return row[0]
+    
+    response = await llm.ainvoke(messages)
+    with cache:
+        cache.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, content, created) VALUES (?, ?, ?)",
+            (key, response.content, time.time())
+        )
+    return response.content
+
+
+def build_llm(model_name: str, temperature: float) -> ChatOpenAI:
+    """Build a ChatOpenAI client (o1 models don't support temperature parameter)"""
+    if model_name.startswith("o1"):
+        return ChatOpenAI(model=model_name)
+    return ChatOpenAI(model=model_name, temperature=temperature)
+
+
 # ========================================
 # Agent State
 # ========================================
@@ -63,7 +118,8 @@ class AgentState(TypedDict):
     previous_sql: Optional[str]
     
     # Results
-    results_df: Optional[pd.DataFrame]
+    data_preview: str  # First rows rendered for the review prompt
+    rows_head: Optional[List[List[Any]]]  # Result rows (capped at hard_max_rows) for final output
     row_count: int
     columns: List[str]
     error: Optional[str]
@@ -74,6 +130,13 @@ class AgentState(TypedDict):
     
     # Internal cache
     _ref_values: Optional[Dict[str, Dict[str, List[str]]]]  # Reference values extracted from data
+    _con: Optional[duckdb.DuckDBPyConnection]  # DuckDB connection with tables registered (one per run)
+    _schema_text: str  # Schema/vocabulary prompt text (form is invariant across turns)
+    _vocab_text: str
+    _llm_gen: ChatOpenAI  # LLM clients reused across turns
+    _llm_review: ChatOpenAI
+    _refine_system: str  # Refinement prompts (invariant across turns)
+    _refine_user: Callable[..., str]
     
     # History (for logging)
     history: Annotated[List[Dict], add]
@@ -83,7 +146,7 @@ class AgentState(TypedDict):
 # Node 1: SQL Generation
 # ========================================
 
-def generate_sql_node(state: AgentState) -> Dict:
+async def generate_sql_node(state: AgentState) -> Dict:
     """Generate SQL from user query (or refine based on feedback)"""
     print(f"\n{'='*70}")
     print(f"🔧 TURN {state['turn'] + 1}: SQL Generation")
@@ -93,30 +156,23 @@ def generate_sql_node(state: AgentState) -> Dict:
     user_request = state["user_request"]
     turn = state["turn"]
     
-    # Build schema context
-    schema_text = build_schema_text(form)
-    vocab_text = build_vocabulary_text(form)
+    # Schema context (built once in run_agent)
+    schema_text = state["_schema_text"]
+    vocab_text = state["_vocab_text"]
     
     # Extract reference values for LLM context (done once per agent run)
     if turn == 0:
-        ref_values = extract_reference_values(form)
+        # Parquet scans block; run them off the event loop
+        ref_values = await asyncio.get_running_loop().run_in_executor(
+            _DUCKDB_POOL, extract_reference_values, form
+        )
         state["_ref_values"] = ref_values  # Cache for subsequent turns
     else:
         ref_values = state.get("_ref_values", {})
     
-    # Get LLM
-    model_cfg = form.get("model", {})
-    model_name = os.getenv("OPENAI_MODEL", model_cfg.get("name", "gpt-4o-mini"))
-    is_reasoning_model = model_name.startswith("o1")
-    
-    # o1 models don't support temperature parameter
-    if is_reasoning_model:
-        llm = ChatOpenAI(model=model_name)
-    else:
-        llm = ChatOpenAI(
-            model=model_name,
-            temperature=model_cfg.get("temperature", 0.0)
-        )
+    # Get LLM (built once per run in run_agent)
+    llm = state["_llm_gen"]
+    is_reasoning_model = llm.model_name.startswith("o1")
     
     # Build prompt based on turn
     if turn == 0:
@@ -131,14 +187,12 @@ def generate_sql_node(state: AgentState) -> Dict:
             default_limit=form["limits"]["default_limit"]
         )
     else:
-        # Refinement attempt
-        agent_config = form["agent"]
-        system_prompt = agent_config["system_prompt"]
-        user_prompt = agent_config["refinement_template"].format(
+        # Refinement attempt (template pre-bound with schema_hint in run_agent)
+        system_prompt = state["_refine_system"]
+        user_prompt = state["_refine_user"](
             previous_sql=state["previous_sql"],
             row_count=state["row_count"],
-            feedback=state["feedback"],
-            schema_hint=f"{schema_text[:500]}..."  # Abbreviated
+            feedback=state["feedback"]
         )
     
     print(f"📝 Generating SQL (attempt {turn + 1})...")
@@ -153,28 +207,28 @@ def generate_sql_node(state: AgentState) -> Dict:
             HumanMessage(content=user_prompt)
         ]
     
-    response = llm.invoke(messages)
-    sql_raw = response.content.strip()
+    sql_raw = (await cached_ainvoke(llm, messages)).strip()
     
     # Clean SQL (remove markdown, explanatory text, etc.)
-    # Extract SQL from markdown code blocks
-    if "```sql" in sql_raw.lower():
+    # Extract SQL from markdown code blocks (plain str.find, no regex)
+    start = sql_raw.lower().find("```sql")
+    if start != -1:
         # Extract SQL from code block
-        import re
-        match = re.search(r'```sql\s*(.*?)\s*```', sql_raw, re.DOTALL | re.IGNORECASE)
-        if match:
-            sql_raw = match.group(1).strip()
-    elif "```" in sql_raw:
+        end = sql_raw.find("```", start + 6)
+        if end != -1:
+            sql_raw = sql_raw[start + 6:end].strip()
+    else:
         # Generic code block
-        import re
-        match = re.search(r'```\s*(.*?)\s*```', sql_raw, re.DOTALL)
-        if match:
-            sql_raw = match.group(1).strip()
-    
-    # Remove any leading SQL: or sql: labels
-    if sql_raw.lower().startswith("sql:"):
+        start = sql_raw.find("```")
+        end = sql_raw.find("```", start + 3) if start != -1 else -1
+        if end != -1:
+            sql_raw = sql_raw[start + 3:end].strip()
+    
+    # Remove any leading SQL: or sql: labels (only the first 4 chars need lowering)
+    label = sql_raw[:4].lower()
+    if label.startswith("sql:"):
         sql_raw = sql_raw[4:].strip()
-    elif sql_raw.lower().startswith("sql"):
+    elif label.startswith("sql"):
         sql_raw = sql_raw[3:].strip()
     
     # Remove any trailing explanatory text (after the query ends with semicolon)
@@ -200,7 +254,11 @@ def generate_sql_node(state: AgentState) -> Dict:
 # Node 2: SQL Execution
 # ========================================
 
-def execute_sql_node(state: AgentState) -> Dict:
+# Blocking DuckDB calls run here so concurrent agents keep the event loop free
+_DUCKDB_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="duckdb")
+
+
+async def execute_sql_node(state: AgentState) -> Dict:
     """Execute SQL and return results"""
     print(f"\n🔍 Executing SQL...")
     
@@ -220,7 +278,8 @@ def execute_sql_node(state: AgentState) -> Dict:
         print(f"❌ SQL Sanitization Error: {e}")
         return {
             "sql_final": sql_raw,
-            "results_df": None,
+            "data_preview": "EMPTY",
+            "rows_head": None,
             "row_count": 0,
             "columns": [],
             "error": f"SQL sanitization failed: {str(e)}",
@@ -231,23 +290,28 @@ def execute_sql_node(state: AgentState) -> Dict:
             }]
         }
     
-    # Execute SQL
-    con = duckdb.connect(database=":memory:")
+    # Execute SQL on the run's shared connection (tables registered once in run_agent)
+    con = state["_con"]
     try:
-        register_tables(con, form)
-        
         exec_start = time.time()
-        results_df = con.execute(sql_final).fetch_df()
+        results_df = await asyncio.get_running_loop().run_in_executor(
+            _DUCKDB_POOL, lambda: con.execute(sql_final).fetch_df()
+        )
         exec_time = time.time() - exec_start
         
         row_count = len(results_df)
         columns = list(results_df.columns)
+        # Compact CSV preview for the LLM (skips to_string's column-width formatting)
+        data_preview = "EMPTY" if row_count == 0 else results_df.head(5).to_csv(index=False)
+        # head() is a view; kept because a LIMIT only inside a subquery isn't clamped by sanitize_sql
+        rows_head = results_df.head(limits["hard_max_rows"]).to_numpy().tolist()
         
         print(f"✅ Execution successful: {row_count} rows in {exec_time:.2f}s")
         
         return {
             "sql_final": sql_final,
-            "results_df": results_df,
+            "data_preview": data_preview,
+            "rows_head": rows_head,
             "row_count": row_count,
             "columns": columns,
             "error": None,
@@ -263,7 +327,8 @@ def execute_sql_node(state: AgentState) -> Dict:
         print(f"❌ Execution Error: {e}")
         return {
             "sql_final": sql_final,
-            "results_df": None,
+            "data_preview": "EMPTY",
+            "rows_head": None,
             "row_count": 0,
             "columns": [],
             "error": str(e),
@@ -273,15 +338,13 @@ def execute_sql_node(state: AgentState) -> Dict:
                 "error": str(e)
             }]
         }
-    finally:
-        con.close()
 
 
 # ========================================
 # Node 3: Review & Decision (Exit Node)
 # ========================================
 
-def review_node(state: AgentState) -> Dict:
+async def review_node(state: AgentState) -> Dict:
     """Review results and decide: REFINE or EXIT"""
     print(f"\n🔎 Reviewing Results...")
     
@@ -322,30 +385,17 @@ def review_node(state: AgentState) -> Dict:
     # Evaluate result quality with LLM
     exit_config = agent_config["exit_node"]
     
-    # Prepare data preview
-    df = state["results_df"]
-    data_preview = "EMPTY" if df is None or len(df) == 0 else df.head(5).to_string()
-    
+    # Data preview (rendered by execute_sql_node)
     user_prompt = exit_config["user_template"].format(
         user_request=state["user_request"],
         sql=state["sql_final"],
         row_count=state["row_count"],
-        data_preview=data_preview
+        data_preview=state["data_preview"]
     )
     
-    # Call LLM for evaluation
-    model_cfg = form.get("model", {})
-    model_name = os.getenv("OPENAI_MODEL", model_cfg.get("name", "gpt-4o-mini"))
-    is_reasoning_model = model_name.startswith("o1")
-    
-    # o1 models don't support temperature parameter
-    if is_reasoning_model:
-        llm = ChatOpenAI(model=model_name)
-    else:
-        llm = ChatOpenAI(
-            model=model_name,
-            temperature=0.3  # Slightly higher for evaluation
-        )
+    # Call LLM for evaluation (built once per run in run_agent)
+    llm = state["_llm_review"]
+    is_reasoning_model = llm.model_name.startswith("o1")
     
     # o1 models require combining system + user into single user message
     if is_reasoning_model:
@@ -357,8 +407,7 @@ def review_node(state: AgentState) -> Dict:
             HumanMessage(content=user_prompt)
         ]
     
-    response = llm.invoke(messages)
-    evaluation = response.content.strip()
+    evaluation = (await cached_ainvoke(llm, messages)).strip()
     
     print(f"📊 Evaluation: {evaluation[:100]}...")
     
@@ -421,17 +470,32 @@ def build_agent_graph() -> StateGraph:
     return graph.compile()
 
 
+# Compiled once at import; the compiled graph is immutable and safe to share across runs
+_AGENT = build_agent_graph()
+
+
 # ========================================
 # Main Runner
 # ========================================
 
-def run_agent(form: Dict[str, Any], user_request: str) -> Dict[str, Any]:
+async def run_agent(form: Dict[str, Any], user_request: str) -> Dict[str, Any]:
     """Run the LangGraph agent"""
     
     agent_config = form.get("agent", {})
     if not agent_config.get("enabled", False):
         agent_config["enabled"] = True  # Enable if using agent script
     
+    # LLM clients, shared by every turn of this run
+    model_cfg = form.get("model", {})
+    model_name = os.getenv("OPENAI_MODEL", model_cfg.get("name", "gpt-4o-mini"))
+    
+    # Prompt context, invariant across turns
+    schema_text = form.get("_schema_text") or build_schema_text(form)
+    refine_user = functools.partial(
+        agent_config["refinement_template"].format,
+        schema_hint=f"{schema_text[:500]}..."  # Abbreviated
+    )
+    
     # Initialize state
     initial_state = {
         "user_request": user_request,
@@ -441,13 +505,21 @@ def run_agent(form: Dict[str, Any], user_request: str) -> Dict[str, Any]:
         "sql": None,
         "sql_final": None,
         "previous_sql": None,
-        "results_df": None,
+        "data_preview": "EMPTY",
+        "rows_head": None,
         "row_count": 0,
         "columns": [],
         "error": None,
         "decision": "",
         "feedback": None,
         "_ref_values": None,
+        "_con": None,
+        "_schema_text": schema_text,
+        "_vocab_text": form.get("_vocab_text") or build_vocabulary_text(form),
+        "_llm_gen": build_llm(model_name, model_cfg.get("temperature", 0.0)),
+        "_llm_review": build_llm(model_name, 0.3),  # Slightly higher for evaluation
+        "_refine_system": agent_config["system_prompt"],
+        "_refine_user": refine_user,
         "history": []
     }
     
@@ -458,11 +530,20 @@ def run_agent(form: Dict[str, Any], user_request: str) -> Dict[str, Any]:
     print(f"Query: {user_request}")
     print(f"Max turns: {initial_state['max_turns']}")
     
-    agent = build_agent_graph()
+    agent = _AGENT
     
-    start_time = time.time()
-    final_state = agent.invoke(initial_state)
-    total_time = time.time() - start_time
+    # Register tables once; every execute turn reuses this connection
+    con = duckdb.connect(database=":memory:")
+    try:
+        # API fetches and view setup block; run them off the event loop
+        await asyncio.get_running_loop().run_in_executor(_DUCKDB_POOL, register_tables, con, form)
+        initial_state["_con"] = con
+        
+        start_time = time.time()
+        final_state = await agent.ainvoke(initial_state)
+        total_time = time.time() - start_time
+    finally:
+        con.close()
     
     # Format result
     result = {
@@ -471,8 +552,7 @@ def run_agent(form: Dict[str, Any], user_request: str) -> Dict[str, Any]:
         "sql_executed": final_state.get("sql_final"),
         "columns": final_state.get("columns", []),
         "row_count": final_state.get("row_count", 0),
-        "rows": final_state["results_df"].head(form["limits"]["hard_max_rows"]).values.tolist() 
-                if final_state.get("results_df") is not None else [],
+        "rows": final_state.get("rows_head") or [],
         "turns_taken": final_state.get("turn", 0),
         "error": final_state.get("error"),
         "feedback": final_state.get("feedback"),
@@ -485,6 +565,46 @@ def run_agent(form: Dict[str, Any], user_request: str) -> Dict[str, Any]:
     return result
 
 
+async def run_agent_batch(form: Dict[str, Any], questions: List[str], concurrency: int = 4) -> List[Dict[str, Any] | BaseException]:
+    """Run the agent for several questions concurrently (LLM calls overlap)
+    
+    At most `concurrency` agent runs are in flight at once, to stay within
+    OpenAI rate limits. Results are returned in the order of `questions`;
+    a run that raised is returned as its exception, so one failure (e.g. a
+    rate-limit error) doesn't discard the other results.
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+    sem = asyncio.Semaphore(concurrency)
+    
+    async def _one(q: str) -> Dict[str, Any]:
+        async with sem:
+            return await run_agent(form, q)
+    
+    return await asyncio.gather(*(_one(q) for q in questions), return_exceptions=True)
+
+
+def positive_int(value: str) -> int:
+    """argparse type for options that must be >= 1"""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
+
+def load_queries(path: str) -> List[str]:
+    """Load queries from a JSONL file (one {"q": "..."} object or JSON string per line)"""
+    queries = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            queries.append(item["q"] if isinstance(item, dict) else str(item))
+    return queries
+
+
 # ========================================
 # Commentary generation
 # ========================================
@@ -504,12 +624,11 @@ def generate_commentary_for_agent(form: Dict[str, Any], user_request: str, resul
     sample_rows = result["rows"][:max_rows]
     
     # Format data as readable text
-    data_lines = []
-    for i, row in enumerate(sample_rows, 1):
-        row_dict = dict(zip(result["columns"], row))
-        # Format row compactly
-        row_str = ", ".join([f"{k}={v}" for k, v in row_dict.items()])
-        data_lines.append(f"{i}. {row_str}")
+    columns = result["columns"]
+    data_lines = [
+        f"{i}. " + ", ".join([f"{k}={v}" for k, v in zip(columns, row)])
+        for i, row in enumerate(sample_rows, 1)
+    ]
     
     data_preview = "\n".join(data_lines)
     
@@ -571,6 +690,46 @@ def generate_commentary_for_agent(form: Dict[str, Any], user_request: str, resul
 # CLI
 # ========================================
 
+def print_agent_result(form: Dict[str, Any], user_request: str, result: Dict[str, Any], print_sql: bool = False) -> None:
+    """Print one agent result (and commentary, if enabled)"""
+    # Print SQL if requested
+    if print_sql:
+        print(f"\n{'='*70}")
+        print(f"--- SQL (final) ---")
+        print(result["sql_executed"])
+        print(f"{'='*70}")
+    
+    # Print result
+    print(f"\n{'='*70}")
+    print(f"📊 RESULT")
+    print(f"{'='*70}")
+    print(json.dumps({
+        "columns": result["columns"],
+        "row_count": result["row_count"],
+        "rows": result["rows"],
+        "turns_taken": result["turns_taken"],
+        "timings_ms": result["timings_ms"]
+    }, indent=2, default=str))
+    
+    if result.get("error"):
+        print(f"\n⚠️  Final error: {result['error']}")
+    
+    if result.get("feedback"):
+        print(f"\n💬 Feedback: {result['feedback']}")
+    
+    print(f"\n🔍 Agent took {result['turns_taken']} turn(s)")
+    
+    # Generate commentary if enabled and no error
+    if not result.get("error"):
+        commentary = generate_commentary_for_agent(form, user_request, result)
+        if commentary:
+            print(f"\n{'='*70}")
+            print(f"💡 COMMENTARY")
+            print(f"{'='*70}")
+            print(commentary)
+            print(f"{'='*70}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="LangGraph Agent for JSON-to-SQL with self-correction"
@@ -580,11 +739,21 @@ def main():
         default="input/form.json",
         help="Path to configuration JSON (default: input/form.json)"
     )
-    parser.add_argument(
+    query_group = parser.add_mutually_exclusive_group(required=True)
+    query_group.add_argument(
         "--q",
-        required=True,
         help="Natural language query"
     )
+    query_group.add_argument(
+        "--queries-file",
+        help="JSONL file of queries to run as a batch (one {\"q\": \"...\"} per line)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=positive_int,
+        default=4,
+        help="Max concurrent agent runs with --queries-file (default: 4)"
+    )
     parser.add_argument(
         "--print-sql",
         action="store_true",
@@ -605,44 +774,24 @@ def main():
     
     # Run agent
     try:
-        result = run_agent(form, args.q)
-        
-        # Print SQL if requested
-        if args.print_sql:
-            print(f"\n{'='*70}")
-            print(f"--- SQL (final) ---")
-            print(result["sql_executed"])
-            print(f"{'='*70}")
-        
-        # Print result
-        print(f"\n{'='*70}")
-        print(f"📊 RESULT")
-        print(f"{'='*70}")
-        print(json.dumps({
-            "columns": result["columns"],
-            "row_count": result["row_count"],
-            "rows": result["rows"],
-            "turns_taken": result["turns_taken"],
-            "timings_ms": result["timings_ms"]
-        }, indent=2, default=str))
-        
-        if result.get("error"):
-            print(f"\n⚠️  Final error: {result['error']}")
-        
-        if result.get("feedback"):
-            print(f"\n💬 Feedback: {result['feedback']}")
+        if args.queries_file:
+            questions = load_queries(args.queries_file)
+            results = asyncio.run(run_agent_batch(form, questions, concurrency=args.concurrency))
+        else:
+            questions = [args.q]
+            results = [asyncio.run(run_agent(form, args.q))]
         
-        print(f"\n🔍 Agent took {result['turns_taken']} turn(s)")
+        failed = 0
+        for question, result in zip(questions, results):
+            if isinstance(result, BaseException):
+                failed += 1
+                print(f"\n❌ Error for query {question!r}: {result}")
+                continue
+            print_agent_result(form, question, result, print_sql=args.print_sql)
         
-        # Generate commentary if enabled and no error
-        if not result.get("error"):
-            commentary = generate_commentary_for_agent(form, args.q, result)
-            if commentary:
-                print(f"\n{'='*70}")
-                print(f"💡 COMMENTARY")
-                print(f"{'='*70}")
-                print(commentary)
-                print(f"{'='*70}")
+        if failed:
+            print(f"\n❌ {failed} of {len(questions)} queries failed")
+            sys.exit(1)
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
@@ -6,15 +6,20 @@ from __future__ import annotations
 import os
 import re
 import csv
+import glob
 import io
 import time
+import tempfile
 import json
 import argparse
+import functools
 from typing import Any, Dict, List, Tuple, Optional
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 import duckdb
 import pandas as pd
+import pyarrow as pa
 
 # Load environment variables from .env file
 try:
@@ -23,6 +28,12 @@ try:
 except ImportError:
     pass
 
+# Optional: C-level JSON serializer for CLI output
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # =========================================
 # Form loader
 # =========================================
@@ -30,31 +41,119 @@ except ImportError:
 def load_form(path: str = "input/form.json") -> Dict[str, Any]:
     """Load BA input form - single source of truth."""
     with open(path, "r") as f:
-        return json.load(f)
+        form = json.load(f)
+    # Derived lookups, built once per form (underscore keys are never read as config)
+    form["_rule_index"] = build_rule_index(form)
+    form["_schema_text"] = build_schema_text(form)
+    form["_vocab_text"] = build_vocabulary_text(form)
+    return form
+
+def build_rule_index(form: Dict[str, Any]) -> Dict[str, str]:
+    """Rule-based queries keyed by normalized request text (comment keys dropped)."""
+    return {
+        k.strip().lower(): v
+        for k, v in form.get("rule_based_queries", {}).items()
+        if not k.startswith("_")
+    }
+
+ENV_VAR_RE = re.compile(r'\$\{([^}]+)\}')
 
 def expand_env_vars(text: str) -> str:
     """Expand ${VAR} style environment variables in strings."""
     def replacer(match):
         var_name = match.group(1)
         return os.getenv(var_name, match.group(0))
-    return re.sub(r'\$\{([^}]+)\}', replacer, text)
+    return ENV_VAR_RE.sub(replacer, text)
 
 # =========================================
 # Data loading (file or API)
 # =========================================
 
-def fetch_json(url: str, headers: Dict[str, str] = None, timeout: int = 30) -> Dict[str, Any]:
-    """Fetch JSON from REST API."""
+def quote_ident(name: str) -> str:
+    """Quote a table/column name as a DuckDB identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+def quote_literal(value: str) -> str:
+    """Quote a string as a DuckDB literal (for statements that can't take parameters)."""
+    return "'" + value.replace("'", "''") + "'"
+
+@functools.lru_cache(maxsize=1)
+def http_session():
+    """Shared requests.Session so API loads reuse pooled keep-alive connections."""
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=64,
+        max_retries=Retry(total=3, backoff_factor=0.2),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_json(url: str, headers: Dict[str, str] = None, timeout: int = 30) -> Dict[str, Any]:
+    """Fetch JSON from REST API."""
     # Expand environment variables in headers
     if headers:
         headers = {k: expand_env_vars(v) for k, v in headers.items()}
     
-    r = requests.get(url, headers=headers or {}, timeout=timeout)
+    r = http_session().get(url, headers=headers or {}, timeout=timeout)
     r.raise_for_status()
     return r.json()
 
+def arrow_from_csv_url(url: str, headers: Dict[str, str] = None, timeout: int = 30) -> pa.Table:
+    """Download a CSV and parse it straight to Arrow with pyarrow's multithreaded reader.
+    
+    Type inference is pyarrow's: ISO-8601 date/time columns become timestamps
+    (pandas would keep them as strings).
+    """
+    import pyarrow.csv as pa_csv
+    
+    if headers:
+        headers = {k: expand_env_vars(v) for k, v in headers.items()}
+    
+    r = http_session().get(url, headers=headers or {}, timeout=timeout)
+    r.raise_for_status()
+    return pa_csv.read_csv(pa.BufferReader(r.content))
+
+BOOL_TRUE = ("true", "1")
+BOOL_FALSE = ("false", "0")
+NUMERIC_PATTERNS = ["exposure_", "limit_", "mtm", "pnl", "notional", "delta", "gamma", "vega", "_pct", "_var", "_stress"]
+
+@functools.lru_cache(maxsize=64)
+def classify_columns(cols: Tuple[str, ...]) -> Tuple[List[str], List[str], List[str]]:
+    """Split column names into (numeric, date, bool) lists by naming convention.
+    
+    Memoized per header: repeated payloads for the same table skip the scan.
+    Treat the returned lists as read-only.
+    """
+    numeric_cols = [c for c in cols if any(pat in c for pat in NUMERIC_PATTERNS)]
+    date_cols = [c for c in cols if c.endswith("_date") or c.endswith("_asof") or "as_of" in c]
+    bool_cols = [c for c in cols if c.endswith("_flag") or c == "collateralized"]
+    return numeric_cols, date_cols, bool_cols
+
+def parse_date_column(s: pd.Series) -> pd.Series:
+    """Parse a string column to datetimes, trying the vectorized ISO-8601 path first.
+    
+    Falls back to pandas' format inference if any non-empty value isn't ISO-8601.
+    """
+    parsed = pd.to_datetime(s, errors="coerce", format="ISO8601", cache=True)
+    if (parsed.isna() & s.ne("")).any():
+        parsed = pd.to_datetime(s, errors="coerce", cache=True)
+    return parsed
+
+def parse_bool_column(s: pd.Series) -> pd.Series:
+    """Map true/false/1/0 (any case) to booleans; anything else becomes NaN."""
+    lowered = s.str.lower()
+    is_true = lowered.isin(BOOL_TRUE)
+    known = is_true | lowered.isin(BOOL_FALSE)
+    if known.all():
+        return is_true
+    return is_true.astype(object).where(known)
+
 def df_from_csv_rows_in_json(
     payload: Dict[str, Any],
     *,
@@ -74,46 +173,124 @@ def df_from_csv_rows_in_json(
     if not raw_rows:
         return pd.DataFrame(columns=header)
     
-    lines: List[str] = []
     if field_key is None:
         lines = [str(r) for r in raw_rows]
     else:
         lines = [str(r.get(field_key, "")) for r in raw_rows]
     
-    # 3) Parse with csv.reader (handles quotes and embedded commas)
-    reader = csv.reader(lines, delimiter=delimiter)
-    records = []
-    for row in reader:
-        if len(row) == len(header):
-            records.append(dict(zip(header, row)))
-        else:
-            if len(row) < len(header):
-                row.extend([""] * (len(header) - len(row)))
-            records.append(dict(zip(header, row[:len(header)])))
-    
-    # 4) Create DataFrame
-    df = pd.DataFrame.from_records(records, columns=header)
-    
-    # 5) Type coercion for common column patterns
-    numeric_patterns = ["exposure_", "limit_", "mtm", "pnl", "notional", "delta", "gamma", "vega", "_pct", "_var", "_stress"]
-    numeric_cols = [c for c in df.columns if any(pat in c for pat in numeric_patterns)]
-    for c in numeric_cols:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
-    
-    date_cols = [c for c in df.columns if c.endswith("_date") or c.endswith("_asof") or "as_of" in c]
-    for c in date_cols:
-        if c in df.columns:
-            df[c] = pd.to_datetime(df[c], errors="coerce")
-    
-    bool_cols = [c for c in df.columns if c.endswith("_flag") or c == "collateralized"]
-    for c in bool_cols:
-        if c in df.columns:
-            df[c] = df[c].astype(str).str.lower().map({"true": True, "false": False, "1": True, "0": False})
+    # 3) Parse with pandas' C CSV engine (handles quotes and embedded commas).
+    #    usecols drops extra fields, short rows are padded with "" (na_filter=False)
+    #    and blank lines become empty rows; the final newline keeps a trailing one.
+    try:
+        df = pd.read_csv(
+            io.StringIO("\n".join(lines) + "\n"),
+            header=None,
+            names=header,
+            usecols=range(len(header)),
+            sep=delimiter,
+            dtype=str,
+            na_filter=False,
+            skip_blank_lines=False,
+            engine="c",
+        )
+    except pd.errors.ParserError:
+        # No row reaches the header width, so read_csv can't size the columns;
+        # pad/truncate each row with csv.reader instead
+        hlen = len(header)
+        rows_out = [
+            (row + [""] * (hlen - len(row)))[:hlen]
+            for row in csv.reader(lines, delimiter=delimiter)
+        ]
+        df = pd.DataFrame(rows_out, columns=header)
+    
+    # 4) Type coercion for common column patterns
+    numeric_cols, date_cols, bool_cols = classify_columns(tuple(header))
+    if numeric_cols:
+        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors="coerce")
+    
+    if date_cols:
+        df[date_cols] = df[date_cols].apply(parse_date_column)
+    
+    if bool_cols:
+        df[bool_cols] = df[bool_cols].apply(parse_bool_column)
     
     return df
 
-def load_table_from_api(source: Dict[str, Any]) -> pd.DataFrame:
+def arrow_from_csv_rows_in_json(
+    payload: Dict[str, Any],
+    *,
+    columns_key: str = "columns",
+    row_key: str = "rows",
+    field_key: Optional[str] = None,
+    delimiter: str = ","
+) -> pa.Table:
+    """Parse CSV-strings-in-JSON with DuckDB's vectorized CSV reader, typed in SQL.
+    
+    Same column heuristics as df_from_csv_rows_in_json, but parsing and type
+    coercion never build a pandas object DataFrame. Differences: empty fields
+    become NULL, dates are ISO-8601 only (anything else becomes NULL), and
+    blank rows are dropped rather than kept as empty rows.
+    """
+    header = payload.get(columns_key)
+    if not header or not isinstance(header, list):
+        raise ValueError(f"Missing or invalid '{columns_key}' array in JSON payload.")
+    
+    raw_rows = payload.get(row_key, [])
+    if field_key is None:
+        lines = [str(r) for r in raw_rows]
+    else:
+        lines = [str(r.get(field_key, "")) for r in raw_rows]
+    
+    # Read every field as VARCHAR, then cast per column (TRY_CAST: bad values -> NULL)
+    numeric_cols, date_cols, bool_cols = classify_columns(tuple(header))
+    select_list = []
+    for c in header:
+        q = quote_ident(c)
+        if c in numeric_cols:
+            select_list.append(f"TRY_CAST({q} AS DOUBLE) AS {q}")
+        elif c in date_cols:
+            select_list.append(f"TRY_CAST({q} AS TIMESTAMP) AS {q}")
+        elif c in bool_cols:
+            select_list.append(f"CASE lower({q}) WHEN 'true' THEN TRUE WHEN '1' THEN TRUE WHEN 'false' THEN FALSE WHEN '0' THEN FALSE END AS {q}")
+        else:
+            select_list.append(q)
+    columns_struct = ", ".join(f"{quote_literal(c)}: 'VARCHAR'" for c in header)
+    
+    # DuckDB reads CSV from a path (file-like objects need fsspec), so spill to a temp file
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8", delete=False) as f:
+        f.write("\n".join(lines))
+        csv_path = f.name
+    con = duckdb.connect(":memory:")
+    try:
+        query = (
+            f"SELECT {', '.join(select_list)} FROM read_csv(?, auto_detect=false, header=false, "
+            f"columns={{{columns_struct}}}, delim=?, quote='\"', escape='\"', "
+            f"null_padding=true, strict_mode=false)"
+        )
+        return con.execute(query, [csv_path, delimiter]).arrow().read_all()
+    finally:
+        con.close()
+        os.unlink(csv_path)
+
+def arrow_from_records(data: List[Dict[str, Any]]) -> pd.DataFrame | pa.Table:
+    """Convert JSON records to Arrow in C; nested, mixed-type or out-of-int64-range payloads use json_normalize.
+    
+    Columns are the union of keys across all records (like json_normalize).
+    """
+    if not data:
+        return pd.json_normalize(data)
+    try:
+        # pa.array infers one struct type over every record; from_pylist would
+        # only take the first record's keys
+        tbl = pa.Table.from_struct_array(pa.array(data))
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        return pd.json_normalize(data)
+    if any(pa.types.is_struct(t) for t in tbl.schema.types):
+        # Nested objects: json_normalize flattens them into "parent.child" columns
+        return pd.json_normalize(data)
+    return tbl
+
+def load_table_from_api(source: Dict[str, Any]) -> pd.DataFrame | pa.Table:
     """Load table from API based on format specification."""
     fmt = source.get("format", "array_of_objects")
     url = source["url"]
@@ -122,11 +299,13 @@ def load_table_from_api(source: Dict[str, Any]) -> pd.DataFrame:
     if fmt == "array_of_objects":
         payload = fetch_json(url, headers)
         data = payload if isinstance(payload, list) else payload.get("data", [])
-        return pd.json_normalize(data)
+        return arrow_from_records(data)
     
     elif fmt == "csv_rows_in_json":
         payload = fetch_json(url, headers)
-        return df_from_csv_rows_in_json(
+        # "engine": "duckdb" decodes and types the CSV inside DuckDB (Arrow result)
+        parse = arrow_from_csv_rows_in_json if source.get("engine") == "duckdb" else df_from_csv_rows_in_json
+        return parse(
             payload,
             columns_key=source.get("columns_key", "columns"),
             row_key=source.get("row_key", "rows"),
@@ -135,50 +314,129 @@ def load_table_from_api(source: Dict[str, Any]) -> pd.DataFrame:
         )
     
     elif fmt == "csv_url":
+        # "engine": "arrow" skips pandas and registers the pyarrow table as-is
+        if source.get("engine") == "arrow":
+            return arrow_from_csv_url(url, headers)
         return pd.read_csv(url)
     
     else:
         raise ValueError(f"Unsupported API format: {fmt}")
 
 def align_columns(df: pd.DataFrame, allowed_cols: List[str]) -> pd.DataFrame:
-    """Align DataFrame to schema by adding missing columns and reordering."""
-    for c in allowed_cols:
-        if c not in df.columns:
-            df[c] = None
+    """Align DataFrame to schema by adding missing columns and reordering.
+    
+    Missing columns are all-None object columns, so they register as untyped
+    NULLs (like align_arrow_columns) rather than DOUBLE NaN. The caller's
+    frame is not mutated.
+    """
+    if list(df.columns) == list(allowed_cols):
+        return df
+    missing = [c for c in allowed_cols if c not in df.columns]
+    if missing:
+        df = df.assign(**dict.fromkeys(missing))
     return df[allowed_cols]
 
+def align_arrow_columns(tbl: pa.Table, allowed_cols: List[str]) -> pa.Table:
+    """Align Arrow table to schema by adding missing (null) columns and reordering."""
+    if tbl.column_names == list(allowed_cols):
+        return tbl
+    for c in allowed_cols:
+        if c not in tbl.column_names:
+            tbl = tbl.append_column(c, pa.nulls(tbl.num_rows))
+    return tbl.select(allowed_cols)
+
+# Files with drifting schemas are unified by column name rather than position.
+# Hive-style key=value directories are auto-detected by DuckDB and pruned by
+# WHERE filters; forcing hive_partitioning=true would only add errors for path
+# lists that mix layouts.
+PARQUET_SCAN_OPTIONS = "union_by_name=true"
+
 def register_tables(con: duckdb.DuckDBPyConnection, form: Dict[str, Any]) -> None:
     """Register all tables in DuckDB based on form configuration.
     
     For Parquet files: Uses DuckDB native reads (zero-copy, blazing fast)
-    Supports glob patterns for partitioned files (e.g., data_*.parquet)
-    For API: Loads to pandas DataFrame first, then registers
+    Supports glob patterns (e.g., data_*.parquet), explicit file lists and
+    hive-partitioned directories (e.g., data/as_of_date=*/*.parquet)
+    For API: Fetches tables concurrently into pandas DataFrames, then registers each
+    as an Arrow table (DuckDB scans Arrow zero-copy instead of its pandas scanner);
+    frames Arrow can't type (mixed-type object columns) are registered as-is
     """
     mode = form["mode"]
     tables_cfg = form["tables"]
     
-    for table_name, table_cfg in tables_cfg.items():
-        cols = table_cfg["columns"]
-        source = table_cfg["source"]
-        
-        if mode == "parquet":
+    if mode == "parquet":
+        for table_name, table_cfg in tables_cfg.items():
+            cols = table_cfg["columns"]
+            source = table_cfg["source"]
+            
             # DuckDB native Parquet read (zero-copy, no pandas needed!)
             file_path = source["file_path"]
             
             # Support glob patterns for partitioned files
             # DuckDB's read_parquet handles globs automatically
             # e.g., 'data_*.parquet' reads all matching files
-            col_list = ", ".join(cols)
-            con.execute(f"CREATE OR REPLACE VIEW {table_name} AS SELECT {col_list} FROM read_parquet('{file_path}')")
-        
-        elif mode == "api":
-            # Load from API to pandas, then register
-            df = load_table_from_api(source)
-            df = align_columns(df, cols)
-            con.register(table_name, df)
-        
-        else:
-            raise ValueError(f"Invalid mode: {mode}. Must be 'parquet' or 'api'.")
+            # A list of paths is passed as a SQL list (no glob expansion)
+            # Views can't take bound parameters, so paths go in as escaped literals
+            if isinstance(file_path, list):
+                path_sql = "[" + ", ".join(map(quote_literal, file_path)) + "]"
+            else:
+                path_sql = quote_literal(file_path)
+            col_list = ", ".join(map(quote_ident, cols))
+            con.execute(
+                f"CREATE OR REPLACE VIEW {quote_ident(table_name)} AS "
+                f"SELECT {col_list} FROM read_parquet({path_sql}, {PARQUET_SCAN_OPTIONS})"
+            )
+    
+    elif mode == "api":
+        # Fetch all tables concurrently (network-bound), then register on this
+        # thread - a DuckDB connection must not be written from several threads
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(tables_cfg)))) as ex:
+            futures = {
+                table_name: ex.submit(load_table_from_api, table_cfg["source"])
+                for table_name, table_cfg in tables_cfg.items()
+            }
+            for table_name, future in futures.items():
+                cols = tables_cfg[table_name]["columns"]
+                data = future.result()
+                if isinstance(data, pa.Table):
+                    tbl = align_arrow_columns(data, cols)
+                else:
+                    # pandas result: align, convert once to Arrow, then register
+                    tbl = align_columns(data, cols)
+                    try:
+                        tbl = pa.Table.from_pandas(tbl, preserve_index=False)
+                    except (pa.ArrowInvalid, pa.ArrowTypeError):
+                        # Object columns with mixed Python types have no Arrow type;
+                        # register the DataFrame and let DuckDB's pandas scanner read it
+                        pass
+                con.register(table_name, tbl)
+    
+    else:
+        raise ValueError(f"Invalid mode: {mode}. Must be 'parquet' or 'api'.")
+
+@functools.lru_cache(maxsize=4)
+def parquet_connection(tables_json: str) -> duckdb.DuckDBPyConnection:
+    """Connection with parquet views registered, cached per tables config."""
+    con = duckdb.connect(database=":memory:")
+    register_tables(con, {"mode": "parquet", "tables": json.loads(tables_json)})
+    return con
+
+def query_connection(form: Dict[str, Any]) -> duckdb.DuckDBPyConnection:
+    """Connection for one query; the caller closes it.
+    
+    Parquet views only hold the path, so they are registered once and each
+    query gets a cursor on the shared database (safe across threads). API
+    tables are fetched data, so they are rebuilt on a fresh connection.
+    """
+    if form["mode"] == "parquet":
+        return parquet_connection(json.dumps(form["tables"], sort_keys=True)).cursor()
+    con = duckdb.connect(database=":memory:")
+    try:
+        register_tables(con, form)
+    except Exception:
+        con.close()
+        raise
+    return con
 
 # =========================================
 # Schema and vocabulary builders
@@ -214,8 +472,16 @@ def have_openai() -> bool:
 class OpenAIAdapter:
     """Adapter for OpenAI API with support for reasoning models (o1/o1-mini)."""
     def __init__(self, model: str = "gpt-4o-mini", temperature: float = 0.0):
-        from openai import OpenAI
-        self.client = OpenAI()
+        import importlib.util
+        import httpx
+        from openai import OpenAI, DefaultHttpxClient
+        # Keep-alive pool sized for concurrent runs; HTTP/2 multiplexing if h2 is installed
+        self.client = OpenAI(
+            http_client=DefaultHttpxClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            )
+        )
         self.model = model
         self.temperature = temperature
         # o1 models don't support system prompts or temperature
@@ -225,23 +491,52 @@ class OpenAIAdapter:
         if self.is_reasoning_model:
             # o1 models: combine system + user into single user message
             combined_prompt = f"{system_prompt}\n\n{user_prompt}"
-            rsp = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "user", "content": combined_prompt},
                 ],
+                stream=True,
             )
         else:
             # Standard models: separate system and user messages
-            rsp = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=self.model,
                 temperature=self.temperature,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt},
                 ],
+                stream=True,
             )
-        return rsp.choices[0].message.content.strip()
+        return self._read_until_fence_closes(stream)
+    
+    @staticmethod
+    def _read_until_fence_closes(stream) -> str:
+        """Collect a streamed completion, stopping once a fenced block has closed.
+        
+        Anything after the closing fence is prose the caller would discard,
+        so there's no point waiting for it.
+        """
+        parts: List[str] = []
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                parts.append(delta)
+                if "`" in delta:
+                    text = "".join(parts)
+                    start = text.find("```")
+                    end = text.find("```", start + 3) if start != -1 else -1
+                    if end != -1:
+                        # The closing chunk may carry trailing prose; cut it off
+                        return text[:end + 3].strip()
+        finally:
+            stream.close()
+        return "".join(parts).strip()
     
     def generate_commentary(self, system_prompt: str, user_prompt: str, temperature: float = 0.3) -> str:
         """Generate natural language commentary about query results."""
@@ -266,18 +561,31 @@ class OpenAIAdapter:
             )
         return rsp.choices[0].message.content.strip()
 
+@functools.lru_cache(maxsize=4)
+def get_openai_adapter(model: str, temperature: float) -> OpenAIAdapter:
+    """Shared adapter per (model, temperature) so calls reuse one client and its connection pool."""
+    return OpenAIAdapter(model=model, temperature=temperature)
+
 # =========================================
 # SQL guardrails
 # =========================================
 
 SELECT_ONLY_RE = re.compile(r"^\s*(with\b|select\b)", re.IGNORECASE | re.DOTALL)
 MULTI_STMT_RE = re.compile(r";\s*[^;\s]")
+LIMIT_KW_RE = re.compile(r"\slimit\s", re.IGNORECASE)
+LIMIT_NUM_RE = re.compile(r"\blimit\s+(\d+)\b", re.IGNORECASE)
 
-def sanitize_sql(sql: str, allow_non_select: bool, default_limit: int, hard_max_rows: int) -> Tuple[str, List[str]]:
-    """Apply guardrails to SQL."""
+@functools.lru_cache(maxsize=512)
+def sanitize_sql(sql: str, allow_non_select: bool, default_limit: int, hard_max_rows: int) -> Tuple[str, Tuple[str, ...]]:
+    """Apply guardrails to SQL.
+    
+    Memoized on all arguments (refinement loops and evaluation runs often
+    resubmit the same SQL); warnings are returned as a tuple so cached
+    results can't be mutated by callers.
+    """
     warnings: List[str] = []
     sql = sql.strip().strip("`")
-    if sql.lower().startswith("sql"):
+    if sql[:3].lower() == "sql":
         sql = sql[3:].lstrip(":").strip()
 
     if MULTI_STMT_RE.search(sql):
@@ -286,24 +594,80 @@ def sanitize_sql(sql: str, allow_non_select: bool, default_limit: int, hard_max_
     if not allow_non_select and not SELECT_ONLY_RE.match(sql):
         raise ValueError("Only SELECT/CTE queries are allowed.")
 
-    lowered = re.sub(r"\s+", " ", sql.lower())
-    has_limit = " limit " in lowered and not lowered.rstrip().endswith(")")
+    # LIMIT keyword between whitespace, matched on the raw SQL (no lowered copy)
+    has_limit = LIMIT_KW_RE.search(sql) is not None and not sql.rstrip().endswith(")")
 
     if not has_limit:
         sql = f"{sql.rstrip().rstrip(';')} LIMIT {default_limit}"
         warnings.append(f"LIMIT {default_limit} added.")
 
-    m = re.search(r"\blimit\s+(\d+)\b", sql, re.IGNORECASE)
-    if m and int(m.group(1)) > hard_max_rows:
-        sql = re.sub(r"\blimit\s+\d+\b", f"LIMIT {hard_max_rows}", sql, flags=re.IGNORECASE)
+    # Clamp every LIMIT above the cap (subquery/CTE and outer); smaller ones are kept
+    clamped = False
+    def _clamp(m: re.Match) -> str:
+        nonlocal clamped
+        if int(m.group(1)) <= hard_max_rows:
+            return m.group(0)
+        clamped = True
+        return f"LIMIT {hard_max_rows}"
+    sql = LIMIT_NUM_RE.sub(_clamp, sql)
+    if clamped:
         warnings.append(f"LIMIT clamped to {hard_max_rows}.")
     
-    return sql, warnings
+    return sql, tuple(warnings)
 
 # =========================================
 # SQL generation
 # =========================================
 
+@functools.lru_cache(maxsize=1)
+def reference_connection() -> duckdb.DuckDBPyConnection:
+    """Shared in-memory connection for reference-value scans (use a cursor per call)."""
+    return duckdb.connect(":memory:")
+
+def source_mtime(file_path: str | Tuple[str, ...]) -> Optional[float]:
+    """Latest mtime across the files a parquet path, glob or path list resolves to."""
+    patterns = (file_path,) if isinstance(file_path, str) else file_path
+    return max((os.path.getmtime(p) for pat in patterns for p in glob.glob(pat)), default=None)
+
+# Per-column query for reference_values.method; each returns one value per row
+REFERENCE_QUERIES = {
+    # First N distinct values in sort order (exact; top-N sort, not a full one)
+    "distinct": "SELECT DISTINCT {q} FROM {src} WHERE {q} IS NOT NULL ORDER BY {q} LIMIT $max_values",
+    # N most frequent values, most frequent first (approximate, no sort)
+    "approx_top_k": "SELECT unnest(approx_top_k({q}, $max_values)) FROM {src}",
+}
+
+@functools.lru_cache(maxsize=128)
+def reference_column_values(
+    file_path: str | Tuple[str, ...], mtime: Optional[float], columns: Tuple[str, ...], max_values: int, method: str = "distinct"
+) -> Tuple[Tuple[str, ...], ...]:
+    """Non-null reference values per column of the parquet file.
+    
+    One query per column: Parquet is columnar, so each reads only its own
+    column. mtime is only part of the cache key, so a rewritten file is rescanned.
+    """
+    if method not in REFERENCE_QUERIES:
+        raise ValueError(f"Invalid reference_values method: {method}. Must be one of {list(REFERENCE_QUERIES)}.")
+    params = {
+        "file_path": file_path if isinstance(file_path, str) else list(file_path),
+        "max_values": max_values,
+    }
+    src = f"read_parquet($file_path, {PARQUET_SCAN_OPTIONS})"
+    cur = reference_connection().cursor()
+    try:
+        out = []
+        for column in columns:
+            try:
+                query = REFERENCE_QUERIES[method].format(q=quote_ident(column), src=src)
+                rows = cur.execute(query, params).fetchall()
+                out.append(tuple(str(r[0]) for r in rows))
+            except Exception as e:
+                # Silently skip columns that don't exist or fail
+                out.append(())
+        return tuple(out)
+    finally:
+        cur.close()
+
 def extract_reference_values(form: Dict[str, Any]) -> Dict[str, Dict[str, List[str]]]:
     """Extract unique values from specified columns for LLM context.
     
@@ -319,42 +683,27 @@ def extract_reference_values(form: Dict[str, Any]) -> Dict[str, Dict[str, List[s
         return {}
     
     max_values = ref_config.get("max_values_per_column", 20)
+    method = ref_config.get("method", "distinct")
     result = {}
     
-    con = duckdb.connect(":memory:")
-    
-    try:
-        for table_name, table_config in ref_config.get("tables", {}).items():
-            # Get file path from tables.{table_name}.source.file_path
-            tables = form.get("tables", {})
-            if table_name not in tables:
-                continue
-            
-            table_def = tables[table_name]
-            source = table_def.get("source", {})
-            file_path = source.get("file_path")
-            
-            if not file_path:
-                continue
-            
-            result[table_name] = {}
-            
-            for column in table_config.get("columns", []):
-                try:
-                    query = f"""
-                        SELECT DISTINCT {column} 
-                        FROM read_parquet('{file_path}')
-                        WHERE {column} IS NOT NULL
-                        ORDER BY {column}
-                        LIMIT {max_values}
-                    """
-                    values = con.execute(query).fetchall()
-                    result[table_name][column] = [str(v[0]) for v in values]
-                except Exception as e:
-                    # Silently skip columns that don't exist or fail
-                    result[table_name][column] = []
-    finally:
-        con.close()
+    for table_name, table_config in ref_config.get("tables", {}).items():
+        # Get file path from tables.{table_name}.source.file_path
+        tables = form.get("tables", {})
+        if table_name not in tables:
+            continue
+        
+        table_def = tables[table_name]
+        source = table_def.get("source", {})
+        file_path = source.get("file_path")
+        
+        if not file_path:
+            continue
+        if isinstance(file_path, list):
+            file_path = tuple(file_path)  # hashable cache key
+        
+        columns = tuple(table_config.get("columns", []))
+        values = reference_column_values(file_path, source_mtime(file_path), columns, max_values, method)
+        result[table_name] = {column: list(v) for column, v in zip(columns, values)}
     
     return result
 
@@ -399,8 +748,8 @@ def build_prompts(form: Dict[str, Any], user_request: str, ref_values: Optional[
         system_prompt = prompts["system"].format(dialect_hint=dialect)
     
     user_prompt = prompts["user_template"].format(
-        schema_text=build_schema_text(form),
-        vocabulary=build_vocabulary_text(form),
+        schema_text=form.get("_schema_text") or build_schema_text(form),
+        vocabulary=form.get("_vocab_text") or build_vocabulary_text(form),
         dialect_hint=dialect,
         user_request=user_request.strip(),
         default_limit=default_limit,
@@ -418,8 +767,8 @@ def extract_filters_from_query(form: Dict[str, Any], user_request: str, llm: 'Op
 Return ONLY the WHERE clause conditions (no SELECT, FROM, etc). If no filters, return 'NONE'."""
     
     # Build context about schema and vocabulary
-    schema_text = build_schema_text(form)
-    vocab_text = build_vocabulary_text(form)
+    schema_text = form.get("_schema_text") or build_schema_text(form)
+    vocab_text = form.get("_vocab_text") or build_vocabulary_text(form)
     
     filter_user = f"""SCHEMA:
 {schema_text}
@@ -453,20 +802,21 @@ def generate_sql(form: Dict[str, Any], user_request: str, use_llm: bool) -> str:
             raise RuntimeError("OPENAI_API_KEY not set. Export it or disable --use-llm.")
         
         model_cfg = form["model"]
-        llm = OpenAIAdapter(
+        llm = get_openai_adapter(
             model=os.getenv("OPENAI_MODEL", model_cfg["name"]),
             temperature=model_cfg["temperature"]
         )
         
-        # Extract reference values for LLM context (done once at generation time)
-        ref_values = extract_reference_values(form)
-        
         # Check if two-stage optimization is enabled
         use_two_stage = form.get("optimization", {}).get("two_stage_optimizer", False)
         
         if use_two_stage:
-            # Stage 1: Extract filters (fast, cheap)
-            filters = extract_filters_from_query(form, user_request, llm)
+            # Stage 1: Extract filters (fast, cheap) while reference values are
+            # scanned from Parquet in the background (DuckDB releases the GIL)
+            with ThreadPoolExecutor(max_workers=1) as ex:
+                ref_future = ex.submit(extract_reference_values, form)
+                filters = extract_filters_from_query(form, user_request, llm)
+                ref_values = ref_future.result()
             
             # Stage 2: Generate SQL with filter hints
             if filters:
@@ -475,22 +825,27 @@ def generate_sql(form: Dict[str, Any], user_request: str, use_llm: bool) -> str:
                 usr_p += f"\n\nHINT: Apply these filters early: {filters}"
                 return llm.generate_sql(sys_p, usr_p)
         
+        else:
+            # Extract reference values for LLM context (done once at generation time)
+            ref_values = extract_reference_values(form)
+        
         # Standard single-stage generation
         sys_p, usr_p = build_prompts(form, user_request, ref_values)
         return llm.generate_sql(sys_p, usr_p)
     
-    # Fallback: rule-based queries
-    key = user_request.strip().lower()
-    rule_queries = form.get("rule_based_queries", {})
-    # Filter out comment keys
-    rule_queries = {k: v for k, v in rule_queries.items() if not k.startswith("_")}
+    # Fallback: rule-based queries (index built by load_form)
+    rule_index = form.get("_rule_index")
+    if rule_index is None:
+        rule_index = build_rule_index(form)
     
-    if key in rule_queries:
-        return rule_queries[key]
+    sql = rule_index.get(user_request.strip().lower())
+    if sql is not None:
+        return sql
     
+    rule_queries = [k for k in form.get("rule_based_queries", {}) if not k.startswith("_")]
     raise ValueError(
         f"No rule-based SQL for query: '{user_request}'. "
-        f"Try one of: {list(rule_queries.keys())} or use --use-llm."
+        f"Try one of: {rule_queries} or use --use-llm."
     )
 
 # =========================================
@@ -515,12 +870,11 @@ def generate_commentary(form: Dict[str, Any], user_request: str, result: Dict[st
     sample_rows = result["rows"][:max_rows]
     
     # Format data as readable text
-    data_lines = []
-    for i, row in enumerate(sample_rows, 1):
-        row_dict = dict(zip(result["columns"], row))
-        # Format row compactly
-        row_str = ", ".join([f"{k}={v}" for k, v in row_dict.items()])
-        data_lines.append(f"{i}. {row_str}")
+    columns = result["columns"]
+    data_lines = [
+        f"{i}. " + ", ".join([f"{k}={v}" for k, v in zip(columns, row)])
+        for i, row in enumerate(sample_rows, 1)
+    ]
     
     data_preview = "\n".join(data_lines)
     
@@ -546,7 +900,7 @@ def generate_commentary(form: Dict[str, Any], user_request: str, result: Dict[st
     # Generate commentary
     try:
         model_cfg = form["model"]
-        llm = OpenAIAdapter(
+        llm = get_openai_adapter(
             model=os.getenv("OPENAI_MODEL", model_cfg["name"]),
             temperature=model_cfg.get("temperature", 0.0)
         )
@@ -565,31 +919,49 @@ def generate_commentary(form: Dict[str, Any], user_request: str, result: Dict[st
             "generation_time_ms": 0
         }
 
+def arrow_rows(tbl: pa.Table) -> List[List[Any]]:
+    """Row-major Python lists from an Arrow table, converted column by column in C.
+    
+    DECIMAL columns (e.g. SUM over integers) become floats, matching what
+    fetch_df used to return; NULLs become None.
+    """
+    cols = []
+    for field, col in zip(tbl.schema, tbl.columns):
+        if pa.types.is_decimal(field.type):
+            col = col.cast(pa.float64())
+        cols.append(col.to_pylist())
+    return [list(r) for r in zip(*cols)]
+
 def run_query(form: Dict[str, Any], user_request: str, use_llm: bool = False, with_commentary: bool = False) -> Dict[str, Any]:
     """Execute natural language query and return results."""
     t0 = time.time()
     
     limits = form["limits"]
     
-    # 1) Generate SQL
-    sql_raw = generate_sql(form, user_request, use_llm=use_llm)
-    
-    # 2) Apply guardrails
-    sql_final, warnings = sanitize_sql(
-        sql_raw,
-        allow_non_select=limits["allow_non_select"],
-        default_limit=limits["default_limit"],
-        hard_max_rows=limits["hard_max_rows"],
-    )
+    # 1) Generate SQL and 2) apply guardrails. With an LLM in the loop, table
+    # registration (API fetches / parquet views) runs in the background meanwhile
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        con_future = ex.submit(query_connection, form) if use_llm else None
+        try:
+            sql_raw = generate_sql(form, user_request, use_llm=use_llm)
+            sql_final, warnings_t = sanitize_sql(
+                sql_raw,
+                allow_non_select=limits["allow_non_select"],
+                default_limit=limits["default_limit"],
+                hard_max_rows=limits["hard_max_rows"],
+            )
+        except Exception:
+            if con_future is not None and con_future.exception() is None:
+                con_future.result().close()
+            raise
+    warnings = list(warnings_t)
     
     # 3) Register tables and execute query
-    con = duckdb.connect(database=":memory:")
+    con = con_future.result() if con_future is not None else query_connection(form)
     try:
-        register_tables(con, form)
-        
         exec_t0 = time.time()
         try:
-            res_df: pd.DataFrame = con.execute(sql_final).fetch_df()
+            res_tbl: pa.Table = con.execute(sql_final).arrow().read_all()
             exec_ms = int((time.time() - exec_t0) * 1000)
         except duckdb.BinderException as e:
             error_msg = str(e)
@@ -629,9 +1001,9 @@ def run_query(form: Dict[str, Any], user_request: str, use_llm: bool = False, wi
     result = {
         "sql_generated": sql_raw.strip(),
         "sql_executed": sql_final.strip(),
-        "columns": list(res_df.columns),
-        "rows": res_df.head(limits["hard_max_rows"]).values.tolist(),
-        "row_count": len(res_df),
+        "columns": res_tbl.schema.names,
+        "rows": arrow_rows(res_tbl.slice(0, limits["hard_max_rows"])),
+        "row_count": res_tbl.num_rows,
         "timings_ms": {
             "total": int((time.time() - t0) * 1000),
             "execution": exec_ms
@@ -686,7 +1058,12 @@ def main():
         "warnings": out["warnings"],
         "timings_ms": out["timings_ms"],
     }
-    print(json.dumps(result_output, indent=2, default=str))
+    if orjson is not None:
+        # Rows are already native Python values (Arrow to_pylist); default=str
+        # only catches the odd leftover type. Datetimes print as ISO-8601.
+        print(orjson.dumps(result_output, option=orjson.OPT_INDENT_2, default=str).decode())
+    else:
+        print(json.dumps(result_output, indent=2, default=str))
     
     # Print commentary if available
     if "commentary" in out:
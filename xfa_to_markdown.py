@@ -9,11 +9,79 @@ Usage: python3 xfa_to_markdown.py input.pdf [output.md]
 import pikepdf
 from xml.etree import ElementTree as ET
 import os
+import string
 import sys
 import argparse
 from pathlib import Path
 from datetime import datetime
 from collections import defaultdict, Counter
+from functools import lru_cache
+
+# Optional: lxml (libxml2) parser with huge-tree/recover support; ElementTree is the fallback
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+XML_PARSE_ERRORS = (ET.ParseError,) + ((etree.XMLSyntaxError,) if etree is not None else ())
+
+# Field values live under <xfa:datasets><xfa:data>; siblings such as
+# <dd:dataDescription> only describe the schema
+XFA_DATA_TAG = '{http://www.xfa.org/schema/xfa-data/1.0/}data'
+
+# Field values shorter than this are interned while parsing
+INTERN_MAX_LEN = 64
+
+FIELD_CATEGORIES = {
+    'Personal Information': [
+        'GivenName', 'FamilyName', 'MiddleName', 'DateOfBirth', 
+        'PlaceOfBirth', 'CountryOfBirth', 'Gender', 'MaritalStatus'
+    ],
+    'Contact Information': [
+        'MailingAddress', 'PhoneNumber', 'EmailAddress', 'Address',
+        'City', 'Province', 'PostalCode', 'Country'
+    ],
+    'Identity Documents': [
+        'PassportNumber', 'PassportCountry', 'PassportIssueDate', 
+        'PassportExpiryDate', 'NationalID', 'IdentityDocument'
+    ],
+    'Application Details': [
+        'ApplyingCategory', 'PurposeOfVisit', 'IntendedDateOfArrival',
+        'IntendedLengthOfStay', 'VisaType', 'ApplicationType'
+    ],
+    'Background Information': [
+        'Education', 'Occupation', 'EmploymentHistory', 'Language',
+        'AbleCommunicateEnglishOrFrench', 'PreviousApplication'
+    ],
+    'Financial Information': [
+        'FundsAvailable', 'FinancialSupport', 'Income', 'Employment'
+    ]
+}
+
+# Category -> lowercased keywords, in priority order: the first category with a
+# keyword anywhere in the lowercased field name wins (str `in` is a C substring search)
+CATEGORY_KEYWORDS = tuple(
+    (category, tuple(keyword.lower() for keyword in keywords))
+    for category, keywords in FIELD_CATEGORIES.items()
+)
+
+# Heading text -> anchor: spaces become '-', punctuation other than '-'/'_' is dropped
+SLUG_TABLE = str.maketrans({**{c: None for c in string.punctuation if c not in '-_'}, ' ': '-'})
+
+@lru_cache(maxsize=64)
+def slugify(text):
+    """Markdown anchor for a heading"""
+    return text.lower().translate(SLUG_TABLE)
+
+@lru_cache(maxsize=4096)
+def category_for(field_name):
+    """Category for a field name, or None (memoized: batches reuse the same templates)"""
+    lowered = field_name.lower()
+    for category, keywords in CATEGORY_KEYWORDS:
+        for keyword in keywords:
+            if keyword in lowered:
+                return category
+    return None
 
 class XFAToMarkdownConverter:
     """Convert XFA PDF data to formatted Markdown"""
@@ -22,11 +90,15 @@ class XFAToMarkdownConverter:
         self.form_data = {}
         self.form_structure = {}
         self.field_counts = Counter()
+        self.n_fields = 0
+        self.total_values = 0
         
     def extract_xfa_data(self, pdf_path):
         """Extract XFA datasets from PDF"""
         try:
-            with pikepdf.open(pdf_path) as pdf:
+            # Memory-map the file (falls back to buffered reads if mmap is unavailable);
+            # only AcroForm -> XFA is touched, so page content is never paged in
+            with pikepdf.open(pdf_path, access_mode=pikepdf.AccessMode.mmap) as pdf:
                 print(f"📖 Opening PDF: {pdf_path}")
                 
                 # Check for XFA
@@ -39,54 +111,86 @@ class XFAToMarkdownConverter:
                 if not isinstance(xfa, pikepdf.Array):
                     return None, "XFA structure not recognized"
                 
-                print(f"🔍 Found XFA with {len(xfa)} components")
+                n_items = len(xfa)
+                print(f"🔍 Found XFA with {n_items} components")
                 
-                # Extract datasets
-                for i in range(0, len(xfa), 2):
-                    if i + 1 < len(xfa):
-                        name = str(xfa[i])
-                        stream = xfa[i+1]
-                        
-                        if name.lower() == 'datasets':
-                            print(f"📊 Extracting datasets...")
-                            data = bytes(stream.read_bytes())
-                            print(f"✅ Extracted {len(data):,} bytes of form data")
-                            return data, None
+                # Extract datasets: walk the (packet name, stream) pairs, stop at the first hit
+                for i in range(0, n_items - 1, 2):
+                    if str(xfa[i]).lower() == 'datasets':
+                        print(f"📊 Extracting datasets...")
+                        data = xfa[i + 1].read_bytes()  # already bytes
+                        print(f"✅ Extracted {len(data):,} bytes of form data")
+                        return data, None
                 
                 return None, "No datasets found in XFA"
                 
         except Exception as e:
             return None, f"Error extracting XFA data: {e}"
     
+    def iter_text_elements(self, xml_data):
+        """Return (tag, text) for every element with non-blank text, in document order
+        
+        Only the xfa:data subtree is walked when present; otherwise the whole document.
+        """
+        if etree is None:
+            root = ET.fromstring(xml_data)
+            data = root.find(XFA_DATA_TAG)
+            elements = (root if data is None else data).iter()
+        else:
+            # libxml2 parse: huge_tree lifts its size limits, recover tolerates broken markup;
+            # whitespace-only text is dropped in C, and no id index or entity expansion is done
+            parser = etree.XMLParser(
+                huge_tree=True, recover=True,
+                remove_blank_text=True, collect_ids=False, resolve_entities=False,
+            )
+            root = etree.fromstring(xml_data, parser)
+            if root is None:
+                raise ET.ParseError("no element found")
+            data = root.find(XFA_DATA_TAG)
+            elements = (root if data is None else data).iter(etree.Element)  # elements only, no comments/PIs
+        return [(elem.tag, elem.text) for elem in elements if elem.text and elem.text.strip()]
+    
     def parse_xml_data(self, xml_data):
         """Parse XML data and organize form information"""
         try:
-            root = ET.fromstring(xml_data)
+            text_elements = self.iter_text_elements(xml_data)
             print(f"🔧 Parsing XML data...")
             
             # Collect all elements with text content
             form_fields = defaultdict(list)
             field_hierarchy = defaultdict(set)
+            local_names = {}  # qualified tag -> local name, computed once per unique tag
+            intern = sys.intern
             
-            for elem in root.iter():
-                # Clean tag name (remove namespace)
-                tag_name = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
+            for tag, text in text_elements:
+                # Clean tag name (remove namespace): '{ns}Name' -> 'Name'
+                name = local_names.get(tag)
+                if name is None:
+                    name = local_names[tag] = intern(tag.rpartition('}')[2])
+                # Short values repeat heavily (Yes/No, country codes): share one str per value
+                text = text.strip()
+                if len(text) < INTERN_MAX_LEN:
+                    text = intern(text)
+                form_fields[name].append(text)
                 
-                if elem.text and elem.text.strip():
-                    text_content = elem.text.strip()
-                    form_fields[tag_name].append(text_content)
-                    self.field_counts[tag_name] += 1
-                    
-                    # Track parent-child relationships (skip for now - getparent not available in standard ET)
-                    # Note: Parent-child tracking would require lxml for getparent() method
+                # Track parent-child relationships (skip for now - getparent not available in standard ET)
+                # Note: Parent-child tracking would require lxml for getparent() method
             
-            self.form_data = dict(form_fields)
+            # Counts are just the list lengths (first-seen order kept for most_common ties)
+            self.field_counts.update({tag_name: len(values) for tag_name, values in form_fields.items()})
+            
+            # Read-only from here on: tuples drop the lists' over-allocation
+            self.form_data = {tag_name: tuple(values) for tag_name, values in form_fields.items()}
             self.form_structure = dict(field_hierarchy)
             
-            print(f"✅ Parsed {len(self.form_data)} field types with {sum(self.field_counts.values())} total values")
+            # Totals are read by the report header and main(); compute them once here
+            self.n_fields = len(self.form_data)
+            self.total_values = sum(self.field_counts.values())
+            
+            print(f"✅ Parsed {self.n_fields} field types with {self.total_values} total values")
             return True
             
-        except ET.ParseError as e:
+        except XML_PARSE_ERRORS as e:
             print(f"❌ XML parsing error: {e}")
             return False
         except Exception as e:
@@ -94,49 +198,24 @@ class XFAToMarkdownConverter:
             return False
     
     def categorize_fields(self):
-        """Categorize fields by type and importance"""
-        categories = {
-            'Personal Information': [
-                'GivenName', 'FamilyName', 'MiddleName', 'DateOfBirth', 
-                'PlaceOfBirth', 'CountryOfBirth', 'Gender', 'MaritalStatus'
-            ],
-            'Contact Information': [
-                'MailingAddress', 'PhoneNumber', 'EmailAddress', 'Address',
-                'City', 'Province', 'PostalCode', 'Country'
-            ],
-            'Identity Documents': [
-                'PassportNumber', 'PassportCountry', 'PassportIssueDate', 
-                'PassportExpiryDate', 'NationalID', 'IdentityDocument'
-            ],
-            'Application Details': [
-                'ApplyingCategory', 'PurposeOfVisit', 'IntendedDateOfArrival',
-                'IntendedLengthOfStay', 'VisaType', 'ApplicationType'
-            ],
-            'Background Information': [
-                'Education', 'Occupation', 'EmploymentHistory', 'Language',
-                'AbleCommunicateEnglishOrFrench', 'PreviousApplication'
-            ],
-            'Financial Information': [
-                'FundsAvailable', 'FinancialSupport', 'Income', 'Employment'
-            ]
-        }
+        """Categorize fields by type and importance
         
-        categorized = defaultdict(dict)
+        Categories keep first-seen (document) order; the fields inside each one, and the
+        uncategorized fields, come out sorted by name from a single sort of all names.
+        """
+        form_data = self.form_data
+        category_of = {field_name: category_for(field_name) for field_name in form_data}
+        categorized = {category: {} for category in category_of.values() if category is not None}
         uncategorized = {}
         
-        for field_name, values in self.form_data.items():
-            categorized_field = False
-            
-            for category, field_list in categories.items():
-                if any(field_name.lower().find(cat_field.lower()) != -1 for cat_field in field_list):
-                    categorized[category][field_name] = values
-                    categorized_field = True
-                    break
-            
-            if not categorized_field:
-                uncategorized[field_name] = values
+        for field_name in sorted(category_of):
+            category = category_of[field_name]
+            if category is not None:
+                categorized[category][field_name] = form_data[field_name]
+            else:
+                uncategorized[field_name] = form_data[field_name]
         
-        return dict(categorized), uncategorized
+        return categorized, uncategorized
     
     def generate_markdown(self, pdf_path, output_path):
         """Generate formatted Markdown report"""
@@ -145,141 +224,144 @@ class XFAToMarkdownConverter:
         
         categorized_fields, uncategorized_fields = self.categorize_fields()
         
-        # Start building markdown content
-        md_content = []
-        
-        # Header
-        md_content.extend([
-            f"# XFA Form Data Report",
-            f"",
-            f"**Source PDF:** `{pdf_name}`  ",
-            f"**Generated:** {timestamp}  ",
-            f"**Total Fields:** {len(self.form_data)}  ",
-            f"**Total Values:** {sum(self.field_counts.values())}  ",
-            f"",
-            "---",
-            ""
-        ])
-        
-        # Table of Contents
-        md_content.extend([
-            "## 📋 Table of Contents",
-            ""
-        ])
-        
-        toc_items = []
-        if categorized_fields:
-            for category in categorized_fields.keys():
-                toc_items.append(f"- [{category}](#{category.lower().replace(' ', '-')})")
-        
-        if uncategorized_fields:
-            toc_items.append("- [Other Fields](#other-fields)")
-        
-        toc_items.extend([
-            "- [Field Statistics](#field-statistics)",
-            "- [Form Structure](#form-structure)"
-        ])
-        
-        md_content.extend(toc_items)
-        md_content.extend(["", "---", ""])
-        
-        # Categorized fields
-        for category, fields in categorized_fields.items():
-            if not fields:
-                continue
-                
-            md_content.extend([
-                f"## 👤 {category}",
+        # Stream lines straight into a buffered binary file (no list + join copy of the
+        # report, no TextIOWrapper): each emit() is one UTF-8 encode and one write
+        with open(output_path, 'wb', buffering=1 << 20) as f:
+            write = f.write
+            
+            def emit(*lines):
+                write('\n'.join((*lines, '')).encode('utf-8'))
+            
+            # Most fields hold one value: write the whole block (heading, value, spacing) at once
+            def emit_single(field_name, value):
+                write(f"### {field_name}\n**Value:** `{value}`\n\n\n".encode('utf-8'))
+            
+            # Header
+            emit(
+                f"# XFA Form Data Report",
+                f"",
+                f"**Source PDF:** `{pdf_name}`  ",
+                f"**Generated:** {timestamp}  ",
+                f"**Total Fields:** {self.n_fields}  ",
+                f"**Total Values:** {self.total_values}  ",
+                f"",
+                "---",
                 ""
-            ])
+            )
             
-            for field_name, values in sorted(fields.items()):
-                md_content.append(f"### {field_name}")
-                
-                if len(values) == 1:
-                    md_content.append(f"**Value:** `{values[0]}`")
-                else:
-                    md_content.append(f"**Options/Values ({len(values)}):**")
-                    for i, value in enumerate(values[:20], 1):  # Limit to first 20
-                        md_content.append(f"{i}. `{value}`")
-                    if len(values) > 20:
-                        md_content.append(f"... and {len(values) - 20} more")
-                
-                md_content.extend(["", ""])
-        
-        # Uncategorized fields
-        if uncategorized_fields:
-            md_content.extend([
-                "## 📝 Other Fields",
+            # Table of Contents
+            emit(
+                "## 📋 Table of Contents",
                 ""
-            ])
+            )
+            
+            if categorized_fields:
+                for category in categorized_fields.keys():
+                    emit(f"- [{category}](#{slugify(category)})")
+            
+            if uncategorized_fields:
+                emit("- [Other Fields](#other-fields)")
+            
+            emit(
+                "- [Field Statistics](#field-statistics)",
+                "- [Form Structure](#form-structure)"
+            )
+            
+            emit("", "---", "")
             
-            for field_name, values in sorted(uncategorized_fields.items()):
-                md_content.append(f"### {field_name}")
+            # Categorized fields
+            for category, fields in categorized_fields.items():
+                if not fields:
+                    continue
+                    
+                emit(
+                    f"## 👤 {category}",
+                    ""
+                )
                 
-                if len(values) == 1:
-                    md_content.append(f"**Value:** `{values[0]}`")
-                elif len(values) <= 10:
-                    md_content.append(f"**Values ({len(values)}):**")
-                    for value in values:
-                        md_content.append(f"- `{value}`")
-                else:
-                    md_content.append(f"**Values ({len(values)}):** `{', '.join(values[:5])}` ... and {len(values) - 5} more")
+                for field_name, values in fields.items():  # already sorted
+                    n_values = len(values)
+                    if n_values == 1:
+                        emit_single(field_name, values[0])
+                        continue
+                    
+                    lines = [f"### {field_name}", f"**Options/Values ({n_values}):**"]
+                    lines += [f"{i}. `{value}`" for i, value in enumerate(values[:20], 1)]  # Limit to first 20
+                    if n_values > 20:
+                        lines.append(f"... and {n_values - 20} more")
+                    emit(*lines, "", "")
+            
+            # Uncategorized fields
+            if uncategorized_fields:
+                emit(
+                    "## 📝 Other Fields",
+                    ""
+                )
                 
-                md_content.extend(["", ""])
-        
-        # Field Statistics
-        md_content.extend([
-            "## 📊 Field Statistics",
-            "",
-            "| Field Name | Value Count | Sample Value |",
-            "|------------|-------------|--------------|"
-        ])
-        
-        for field_name, count in self.field_counts.most_common(20):
-            sample_value = self.form_data[field_name][0][:50] if self.form_data[field_name] else "N/A"
-            if len(sample_value) == 50:
-                sample_value += "..."
-            md_content.append(f"| `{field_name}` | {count} | `{sample_value}` |")
-        
-        if len(self.field_counts) > 20:
-            md_content.append(f"| ... | ... | *{len(self.field_counts) - 20} more fields* |")
-        
-        md_content.extend(["", ""])
-        
-        # Form Structure
-        if self.form_structure:
-            md_content.extend([
-                "## 🏗️ Form Structure",
+                for field_name, values in uncategorized_fields.items():  # already sorted
+                    n_values = len(values)
+                    if n_values == 1:
+                        emit_single(field_name, values[0])
+                    elif n_values <= 10:
+                        emit(f"### {field_name}", f"**Values ({n_values}):**",
+                             *[f"- `{value}`" for value in values], "", "")
+                    else:
+                        emit(f"### {field_name}",
+                             f"**Values ({n_values}):** `{', '.join(values[:5])}` ... and {n_values - 5} more",
+                             "", "")
+            
+            # Field Statistics
+            emit(
+                "## 📊 Field Statistics",
                 "",
-                "Parent-child field relationships:",
-                ""
-            ])
+                "| Field Name | Value Count | Sample Value |",
+                "|------------|-------------|--------------|"
+            )
             
-            for parent, children in sorted(self.form_structure.items()):
-                if children:
-                    md_content.append(f"**{parent}**")
-                    for child in sorted(children):
-                        md_content.append(f"  - {child}")
-                    md_content.append("")
-        
-        # Footer
-        md_content.extend([
-            "---",
-            "",
-            f"*Report generated by XFA to Markdown Converter*  ",
-            f"*Source: {pdf_name}*  ",
-            f"*Generated: {timestamp}*"
-        ])
-        
-        # Write to file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(md_content))
+            form_data = self.form_data
+            rows = []
+            for field_name, count in self.field_counts.most_common(20):
+                values = form_data[field_name]
+                sample_value = values[0][:50] if values else "N/A"
+                ellipsis = "..." if len(sample_value) == 50 else ""
+                rows.append(f"| `{field_name}` | {count} | `{sample_value}{ellipsis}` |")
+            emit(*rows)
+            
+            if len(self.field_counts) > 20:
+                emit(f"| ... | ... | *{len(self.field_counts) - 20} more fields* |")
+            
+            emit("", "")
+            
+            # Form Structure
+            if self.form_structure:
+                emit(
+                    "## 🏗️ Form Structure",
+                    "",
+                    "Parent-child field relationships:",
+                    ""
+                )
+                
+                for parent, children in sorted(self.form_structure.items()):
+                    if children:
+                        emit(f"**{parent}**")
+                        for child in sorted(children):
+                            emit(f"  - {child}")
+                        emit("")
+            
+            # Footer (last line has no trailing newline)
+            emit(
+                "---",
+                "",
+                f"*Report generated by XFA to Markdown Converter*  ",
+                f"*Source: {pdf_name}*  "
+            )
+            write(f"*Generated: {timestamp}*".encode('utf-8'))
         
         print(f"📄 Markdown report saved to: {output_path}")
         return output_path
 
-def main():
+def build_parser():
+    """Command-line parser (separate from main() so it can be exercised in-process)"""
     parser = argparse.ArgumentParser(
         description='Extract XFA form data from PDF and generate Markdown report',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -294,8 +376,10 @@ Examples:
     parser.add_argument('pdf_path', help='Path to XFA PDF file')
     parser.add_argument('output_path', nargs='?', help='Output Markdown file path (optional)')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
-    
-    args = parser.parse_args()
+    return parser
+
+def main():
+    args = build_parser().parse_args()
     
     # Validate input file
     if not os.path.exists(args.pdf_path):
@@ -330,8 +414,8 @@ Examples:
         print("=" * 40)
         print(f"✅ Success! Report generated:")
         print(f"📁 {output_file}")
-        print(f"📊 {len(converter.form_data)} field types extracted")
-        print(f"📈 {sum(converter.field_counts.values())} total values processed")
+        print(f"📊 {converter.n_fields} field types extracted")
+        print(f"📈 {converter.total_values} total values processed")
         
     except Exception as e:
         print(f"❌ Error generating report: {e}")